@@ -8,16 +8,16 @@ import scipy.stats
 files = ['MPH.csv','PP.csv','4MMC.csv','4mar.csv','A.csv','Cocaine.csv','MA.csv']
 
 # 各ファイルからデータを読み込み、MPHに対してMW活性を正規化
+# （MW列だけndarrayで持ち回り、DataFrame/Seriesの中間オブジェクトを作らない）
 def process_files(files):
     data = []
     for file in files:
         if os.path.isfile(file):
-            df = pd.read_csv(file)
+            mw = pd.read_csv(file, usecols=['MW'])['MW'].to_numpy(dtype=np.float64)
             if file == '4mar.csv':
-                mph_MW = df['MW']  # 4marのMWを取得
+                mph_MW = mw  # 4marのMWを取得
             else:
-                df['Normalized MW'] = df['MW'] / mph_MW
-                data.append(df['Normalized MW'])
+                data.append(mw / mph_MW)
     return data
 
 # 全てのデータを一つのリストに結合
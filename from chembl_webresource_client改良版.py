@@ -41,17 +41,26 @@ def compute_descriptors(smiles):
     return descriptors
 
 # データの準備
-data = []
-labels = []
-for _, act in df.iterrows():
-    if act['standard_value'] is not None and act['canonical_smiles'] is not None:
-        descriptors = compute_descriptors(act['canonical_smiles'])
-        if descriptors is not None:
-            data.append(descriptors)
-            labels.append(float(act['standard_value']))
+# iterrowsは行ごとにSeriesを生成して遅いので、列ごとにndarrayへ取り出して回す
+df = df[df['standard_value'].notna() & df['canonical_smiles'].notna()]
+df = df[df['standard_value'].astype(float) > 0]  # log10(0)を避ける
+smiles_arr = df['canonical_smiles'].to_numpy()
+values_arr = df['standard_value'].to_numpy(dtype=np.float64)
 
-data = np.array(data)
-labels = np.array(labels)
+data = []
+valid = np.zeros(len(smiles_arr), dtype=bool)
+for i in range(len(smiles_arr)):
+    descriptors = compute_descriptors(smiles_arr[i])
+    if descriptors is not None:
+        data.append(descriptors)
+        valid[i] = True
+
+# Kerasは内部でfloat32にキャストするので、最初からfloat32で持てば
+# メモリ半減とコピー1回分の削減になる
+data = np.array(data, dtype=np.float32)
+# IC50(nM)はpIC50 = -log10(IC50 * 1e-9) に列全体を1回で変換する
+# （数桁にわたるIC50をそのまま回帰するより数値的に素直なターゲットになる）
+labels = (-np.log10(values_arr[valid] * 1e-9)).astype(np.float32)
 
 # データの分割
 train_data, test_data, train_labels, test_labels = train_test_split(data, labels, test_size=0.2, random_state=42)
@@ -80,10 +89,8 @@ print(f"Test loss: {test_loss}")
 def predict_ic50(smiles):
     # SMILESを分子記述子に変換
     descriptors = compute_descriptors(smiles)
-    # モデルによる予測
-    predicted_ic50 = model.predict(np.array([descriptors]))
-    # IC50の予測値を-pIC50として返す
-    return -np.log10(predicted_ic50)
+    # モデルによる予測（ラベルがpIC50なので予測値をそのまま返す）
+    return model.predict(np.array([descriptors], dtype=np.float32))
 
 # ボタンが押されたときの処理
 def on_button_press():
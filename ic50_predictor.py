@@ -0,0 +1,601 @@
+import json
+import os
+from functools import partial
+
+import requests_cache
+
+# ChEMBLへのHTTPリクエスト自体もSQLiteにキャッシュする（1日有効）
+requests_cache.install_cache('chembl_cache', backend='sqlite', expire_after=86400)
+
+from chembl_webresource_client.new_client import new_client
+try:
+    import chembl_downloader
+except ImportError:
+    chembl_downloader = None
+import tensorflow as tf
+
+# ワーカーごとのTFスレッド数を抑えてOptunaのtrial並列とのオーバーサブスクリプションを防ぐ
+# （eagerコンテキスト初期化後は変更できないので、最初のTF演算より前のここで設定する）
+tf.config.threading.set_intra_op_parallelism_threads(1)
+from joblib import Memory, Parallel, delayed
+from tensorflow.keras import mixed_precision
+
+# GPU/AVX-512環境では半精度で計算してメモリ帯域とスループットを稼ぐ
+mixed_precision.set_global_policy('mixed_float16')
+from rdkit import Chem
+from rdkit.Chem import Descriptors
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import matplotlib
+# ディスプレイのないバッチ実行ではGUIバックエンドを使わない
+if not os.environ.get('DISPLAY') and os.name == 'posix':
+    matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import optuna
+from optuna.integration import TFKerasPruningCallback
+from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import train_test_split, KFold, StratifiedKFold, learning_curve
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.inspection import permutation_importance
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_curve, auc
+from keras.models import Model
+from keras.layers import Input, Dense, Dropout
+from keras.callbacks import EarlyStopping
+from keras.wrappers.scikit_learn import KerasClassifier
+import tf2onnx
+import onnxruntime
+import shap
+
+# 使用する分子記述子（11種類）
+DESCRIPTOR_NAMES = [
+    'MolWt', 'MolLogP', 'NumHDonors', 'NumHAcceptors', 'TPSA',
+    'NumRotatableBonds', 'RingCount', 'FractionCSP3',
+    'HeavyAtomCount', 'NumAromaticRings', 'MolMR',
+]
+
+# IC50がこの値(nM)未満なら活性ありとする
+ACTIVITY_THRESHOLD = 1000.0
+
+# 計算済み記述子の保存先（target_idでパーティションしたParquetデータセット）
+DESCRIPTOR_DATASET = 'chembl_desc.parquet'
+
+# ChEMBLのレスポンスをディスクにキャッシュして再実行時のネットワークアクセスを省く
+memory = Memory('.joblib_cache', verbose=0)
+
+
+# ChEMBLのSQLiteダンプから1本のSQLで取得するクエリ
+_ACTIVITY_SQL = """
+SELECT cs.canonical_smiles, act.standard_value
+FROM activities act
+JOIN assays a ON act.assay_id = a.assay_id
+JOIN target_dictionary t ON a.tid = t.tid
+JOIN compound_structures cs ON act.molregno = cs.molregno
+WHERE t.chembl_id = ?
+  AND act.standard_type = 'IC50'
+  AND act.standard_value IS NOT NULL
+"""
+
+
+@memory.cache
+def fetch_activities(target_chembl_id):
+    # ローカルのSQLiteダンプを直接引き、数千回のHTTPラウンドトリップを
+    # 1回のインデックス参照に置き換える
+    if chembl_downloader is not None:
+        with chembl_downloader.connect() as con:
+            return pd.read_sql(_ACTIVITY_SQL, con, params=(target_chembl_id,))
+    # chembl-downloaderが無い環境ではREST APIにフォールバック
+    # .only()で使う列だけ要求し、1ページあたりの転送量とパース時間を抑える
+    activities = new_client.activity
+    res = activities.filter(target_chembl_id=target_chembl_id) \
+                    .filter(standard_type='IC50') \
+                    .only(['canonical_smiles', 'standard_value'])
+    return pd.DataFrame.from_dict(res)
+
+
+# しきい値判定：bool→int64の二重中間配列を作らず、int8へ1回でキャストする
+def _cls(p, thr=0.5):
+    return (p > thr).astype(np.int8)
+
+
+# MolecularDescriptorCalculator.CalcDescriptorsは呼び出しごとに
+# 記述子名の解決とタプル構築をPython側で行うので、C実装の記述子関数を
+# import時に一度だけタプルへ束ね、確保済みの行へ直接書き込む
+# （計算本体はRDKitのC++側にあり、Numba等でJITする余地はない）
+_DESCRIPTOR_FUNCS = tuple(dict(Descriptors.descList)[name] for name in DESCRIPTOR_NAMES)
+
+
+# 記述子計算に必要な工程だけサニタイズしてパースする
+# （MolFromSmilesの既定は全サニタイズを走らせるが、キラリティの後始末などは
+# ここで使う記述子に影響しない）
+def _mol_from_smiles_fast(smiles):
+    mol = Chem.MolFromSmiles(smiles, sanitize=False)
+    if mol is None:
+        return None
+    try:
+        Chem.SanitizeMol(mol, sanitizeOps=Chem.SANITIZE_ALL ^ Chem.SANITIZE_CLEANUPCHIRALITY)
+    except Exception:
+        return None
+    return mol
+
+
+# 正規化SMILESをキーに記述子をキャッシュする
+# （ChEMBLのactivityは同一分子の重複行が多く、キャッシュヒットはdict参照だけで済む）
+_descriptor_cache = {}
+
+
+# SMILESから分子記述子を計算
+# パース済みのmolをそのまま記述子計算に使い、キャッシュミス時の再パースを避ける
+def compute_descriptors(smiles):
+    mol = _mol_from_smiles_fast(smiles)
+    if mol is None:
+        return None
+    canon_smiles = Chem.MolToSmiles(mol)
+    out = _descriptor_cache.get(canon_smiles)
+    if out is None:
+        out = np.empty(len(_DESCRIPTOR_FUNCS), dtype=np.float64)
+        for i, func in enumerate(_DESCRIPTOR_FUNCS):
+            out[i] = func(mol)
+        _descriptor_cache[canon_smiles] = out
+    return out
+
+
+# 2出力（DAT, NET）のニューラルネットワークを構築
+# 共有トランク + 2シグモイドヘッドのfunctional APIで、
+# DAT/NETを連結した入力を1回のforwardで処理できるようにする
+# （モジュールレベル関数にしておくとpartialで束ねてjoblibワーカーへpickleできる）
+def build_model(units1=128, units2=64, dropout=0.2):
+    inputs = Input(shape=(len(DESCRIPTOR_NAMES),))
+    trunk = Dense(units1, activation='relu')(inputs)
+    trunk = Dropout(dropout)(trunk)
+    trunk = Dense(units2, activation='relu')(trunk)
+    # 出力層はfloat32に残してlossの数値精度を保つ
+    outputs = Dense(2, activation='sigmoid', dtype='float32')(trunk)
+    model = Model(inputs, outputs)
+    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+    return model
+
+
+# fold間でreportのstepが衝突しないよう、epoch番号にfoldごとのオフセットを足して報告する
+# （Optunaはstepごとに最初の値しか保持しないため、素のTFKerasPruningCallbackを
+# 複数foldで使うとfold 0のepoch番号と衝突して以降の報告が捨てられる）
+class _FoldPruningCallback(TFKerasPruningCallback):
+    def __init__(self, trial, monitor, step_offset):
+        super().__init__(trial, monitor)
+        self._step_offset = step_offset
+
+    def on_epoch_end(self, epoch, logs=None):
+        super().on_epoch_end(epoch + self._step_offset, logs)
+
+
+class IC50Predictor:
+    # DAT(CHEMBL238)とNET(CHEMBL228)のIC50活性を同時に予測する2出力モデル
+    def __init__(self):
+        data_dat, labels_dat = self.load_data_dat()
+        data_net, labels_net = self.load_data_net()
+
+        # DATとNETのサンプル数を揃える（2タスク学習のため）
+        n = min(len(data_dat), len(data_net))
+        data_dat, labels_dat = data_dat[:n], labels_dat[:n]
+        data_net, labels_net = data_net[:n], labels_net[:n]
+
+        (self.train_data_dat, self.test_data_dat,
+         self.train_labels_dat, self.test_labels_dat) = train_test_split(
+            data_dat, labels_dat, test_size=0.2, random_state=42)
+        (self.train_data_net, self.test_data_net,
+         self.train_labels_net, self.test_labels_net) = train_test_split(
+            data_net, labels_net, test_size=0.2, random_state=42)
+
+        # 特徴量スケーリング
+        # DATとNETを積み上げたデータで一度だけfitする
+        # （以前はDATでfitした統計量をNETのfit_transformが上書きしており、
+        # テストデータがNETの統計量でスケーリングされてしまっていた）
+        self.scaler = StandardScaler()
+        self.scaler.fit(np.concatenate((self.train_data_dat, self.train_data_net)))
+        self.train_data_scaled_dat = self.scaler.transform(self.train_data_dat)
+        self.train_data_scaled_net = self.scaler.transform(self.train_data_net)
+        self.test_data_scaled_dat = self.scaler.transform(self.test_data_dat)
+        self.test_data_scaled_net = self.scaler.transform(self.test_data_net)
+
+        # 学習用の連結テンソルは毎回作り直さず、連続なfloat32配列として先に作っておく
+        self._X_train = np.ascontiguousarray(
+            np.concatenate((self.train_data_scaled_dat, self.train_data_scaled_net)),
+            dtype=np.float32)
+        self._y_pairs = np.column_stack(
+            (self.train_labels_dat, self.train_labels_net)).astype(np.float32)
+        self._y_train = np.concatenate((self._y_pairs, self._y_pairs))
+
+        # 入力パイプラインは一度だけ構築して全fitで使い回す
+        # （cacheで再コピーを避け、prefetchで前処理と計算をオーバーラップさせる）
+        # _X_trainはDAT行→NET行の順に積んであるので、そのまま先頭を切ると
+        # 検証データがDATだけになる。固定シードで並べ替えてから1割を切り出す
+        perm = np.random.default_rng(42).permutation(len(self._X_train))
+        X_perm = self._X_train[perm]
+        y_perm = self._y_train[perm]
+        n_val = int(len(X_perm) * 0.1)
+        self._train_ds = (tf.data.Dataset.from_tensor_slices(
+            (X_perm[n_val:], y_perm[n_val:]))
+            .cache().shuffle(len(X_perm) - n_val)
+            .batch(256).prefetch(tf.data.AUTOTUNE))
+        self._val_ds = (tf.data.Dataset.from_tensor_slices(
+            (X_perm[:n_val], y_perm[:n_val]))
+            .cache().batch(256).prefetch(tf.data.AUTOTUNE))
+
+        self.model = None
+        self.best_params = None
+        self._rf_model = None
+        self._onnx_session = None
+        self._onnx_input = None
+        self._model_templates = {}
+
+    # ChEMBLからターゲットのIC50データを取得して記述子に変換
+    def _load_target(self, target_chembl_id):
+        # 計算済みの記述子はParquetデータセットに永続化してあるので、
+        # 2回目以降はtarget_idのパーティションだけをpredicate pushdownで読む
+        if os.path.exists(DESCRIPTOR_DATASET):
+            table = ds.dataset(DESCRIPTOR_DATASET, partitioning='hive').to_table(
+                columns=DESCRIPTOR_NAMES + ['label'],
+                filter=ds.field('target_id') == target_chembl_id)
+            if table.num_rows > 0:
+                X = np.column_stack(
+                    [table.column(name).to_numpy() for name in DESCRIPTOR_NAMES]
+                ).astype(np.float32)
+                return X, table.column('label').to_numpy().astype(np.float32)
+        df = fetch_activities(target_chembl_id)
+        df = df[df['standard_value'].notna() & df['canonical_smiles'].notna()]
+        df['standard_value'] = df['standard_value'].astype(float)
+        # 同一分子の重複行（アッセイ違い・再測定）をまとめてIC50は中央値に集約し、
+        # 記述子計算をユニークな分子1回ずつに減らす
+        df = df.groupby('canonical_smiles', as_index=False).agg(
+            standard_value=('standard_value', 'median'))
+        smiles = df['canonical_smiles'].to_numpy()
+        values = df['standard_value'].to_numpy(dtype=np.float64)
+
+        # 記述子計算は分子ごとに独立なので全コアで並列計算する
+        descriptors_list = Parallel(n_jobs=-1, backend='loky', batch_size=256)(
+            delayed(compute_descriptors)(s) for s in smiles)
+        # (n, 11)のfloat32行列を先に確保して行単位で書き込み、
+        # パースできなかった行はマスクで落とす
+        # （リストにappendしてからnp.arrayすると余計なコピーとオブジェクト配列を挟む）
+        X = np.empty((len(smiles), len(DESCRIPTOR_NAMES)), dtype=np.float32)
+        mask = np.zeros(len(smiles), dtype=bool)
+        for i, descriptors in enumerate(descriptors_list):
+            if descriptors is not None:
+                X[i] = descriptors
+                mask[i] = True
+        X = X[mask]
+        # ラベルのしきい値判定も行単位ではなく列全体で1回で行う
+        y = (values[mask] < ACTIVITY_THRESHOLD).astype(np.float32)
+
+        columns = {name: X[:, j] for j, name in enumerate(DESCRIPTOR_NAMES)}
+        columns['label'] = y
+        columns['target_id'] = np.full(len(y), target_chembl_id)
+        pq.write_to_dataset(pa.table(columns), DESCRIPTOR_DATASET,
+                            partition_cols=['target_id'])
+        return X, y
+
+    def load_data_dat(self):
+        return self._load_target('CHEMBL238')
+
+    def load_data_net(self):
+        return self._load_target('CHEMBL228')
+
+    def create_model(self, units1=128, units2=64, dropout=0.2):
+        return build_model(units1, units2, dropout)
+
+    # 同一形状のモデルはテンプレートをキャッシュし、clone_modelで複製する
+    # （Kerasのグラフ構築とcompileはこのサイズのモデルではtrial時間の大きな割合を占める）
+    def _model_for_trial(self, units1, units2, dropout):
+        key = (units1, units2, dropout)
+        template = self._model_templates.get(key)
+        if template is None:
+            template = self.create_model(units1, units2, dropout)
+            self._model_templates[key] = template
+        # clone_modelは層の初期化子で重みを新しく生成するので、fold間で重みは共有されない
+        model = tf.keras.models.clone_model(template)
+        model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+        return model
+
+    # Optunaの目的関数（5分割CVの平均precisionを最大化）
+    def objective(self, trial):
+        units1 = trial.suggest_int('units1', 32, 512, log=True)
+        units2 = trial.suggest_int('units2', 16, 256, log=True)
+        dropout = trial.suggest_float('dropout', 0.0, 0.5)
+
+        kf = KFold(n_splits=5, shuffle=True, random_state=42)
+        epochs = 100
+        scores = []
+        for fold_idx, (train_idx, val_idx) in enumerate(kf.split(self.train_data_scaled_dat)):
+            # モデルはfoldごとに作り直す（使い回すと重みがfold間で共有されてしまう）
+            model = self._model_for_trial(units1, units2, dropout)
+            x_train = np.concatenate((self.train_data_scaled_dat[train_idx],
+                                      self.train_data_scaled_net[train_idx]))
+            y_train = np.concatenate((self._y_pairs[train_idx], self._y_pairs[train_idx]))
+            x_val_dat = self.train_data_scaled_dat[val_idx]
+            x_val_net = self.train_data_scaled_net[val_idx]
+
+            # 11次元の小さいモデルではバッチ処理のオーバーヘッドが支配的なので256で回す
+            model.fit(x_train, y_train, epochs=epochs, batch_size=256,
+                      validation_split=0.1, verbose=0,
+                      callbacks=[EarlyStopping(monitor='val_loss', patience=5,
+                                               restore_best_weights=True),
+                                 _FoldPruningCallback(trial, 'val_accuracy',
+                                                      step_offset=fold_idx * epochs)])
+
+            # DAT/NETの検証データをまとめて1回のpredictで推論する
+            preds = model.predict(np.concatenate((x_val_dat, x_val_net)), batch_size=512)
+            p_dat, p_net = np.split(preds, [len(x_val_dat)])
+            pred_dat = _cls(p_dat[:, 0])
+            pred_net = _cls(p_net[:, 1])
+            score_dat = precision_score(self.train_labels_dat[val_idx], pred_dat, zero_division=0)
+            score_net = precision_score(self.train_labels_net[val_idx], pred_net, zero_division=0)
+            scores.append((score_dat + score_net) / 2)
+
+            # 各fold終了時に途中経過を報告し、見込みのないtrialは打ち切る
+            # （stepはepoch報告が使う範囲（5 fold x epochs）の後ろに置いて衝突を避ける）
+            trial.report(float(np.mean(scores)), step=5 * epochs + fold_idx)
+            if trial.should_prune():
+                raise optuna.TrialPruned()
+
+        return float(np.mean(scores))
+
+    # Optunaによるハイパーパラメータ最適化（ASHA pruningで早期打ち切り）
+    # trialは独立なのでn_jobsで全コアを使い、SQLiteストレージで共有する
+    def optuna_optimize(self, n_trials=100):
+        study = optuna.create_study(
+            direction='maximize',
+            storage='sqlite:///ic50.db', study_name='ic50', load_if_exists=True,
+            pruner=optuna.pruners.SuccessiveHalvingPruner(min_resource=1, reduction_factor=3))
+        # 既に予算分のtrialがストレージにあれば追加では走らせず、差分だけ実行する
+        remaining = n_trials - len(study.trials)
+        if remaining > 0:
+            study.optimize(self.objective, n_trials=remaining, n_jobs=os.cpu_count())
+        self.best_params = study.best_params
+        with open('best_params.json', 'w') as f:
+            json.dump(self.best_params, f)
+        return study
+
+    # グリッド探索（pruning付きのobjectiveを再利用するのでGridSearchCVより大幅に速い）
+    def grid_search_optimize(self):
+        param_grid = {
+            'units1': [32, 64, 128, 256, 384, 512],
+            'units2': [16, 32, 64, 128, 192, 256],
+            'dropout': [0.0, 0.1, 0.2, 0.3, 0.4],
+        }
+        study = optuna.create_study(
+            direction='maximize',
+            sampler=optuna.samplers.GridSampler(param_grid),
+            pruner=optuna.pruners.SuccessiveHalvingPruner(min_resource=1, reduction_factor=3))
+        study.optimize(self.objective)
+        return study.best_params
+
+    # 最適パラメータでモデルを学習し、テストデータで評価
+    def train_and_evaluate(self):
+        params = self.best_params or {}
+        self.model = self.create_model(**params)
+        self.model.fit(self._train_ds, validation_data=self._val_ds, epochs=100)
+
+        # テストデータをまとめて1回だけ推論し、結果を使い回す
+        preds = self.model.predict(
+            np.concatenate((self.test_data_scaled_dat, self.test_data_scaled_net)), batch_size=512)
+        p_dat, p_net = np.split(preds, [len(self.test_data_scaled_dat)])
+        pred_dat = _cls(p_dat[:, 0])
+        pred_net = _cls(p_net[:, 1])
+        print(f"DAT accuracy: {accuracy_score(self.test_labels_dat, pred_dat)}")
+        print(f"DAT precision: {precision_score(self.test_labels_dat, pred_dat)}")
+        print(f"NET accuracy: {accuracy_score(self.test_labels_net, pred_net)}")
+        print(f"NET precision: {precision_score(self.test_labels_net, pred_net)}")
+
+        # 読み取り専用の推論はONNX Runtimeの融合カーネルで実行する
+        self._build_onnx_session()
+
+    # 学習済みKerasモデルをONNXに変換してInferenceSessionを作る
+    def _build_onnx_session(self):
+        onnx_model, _ = tf2onnx.convert.from_keras(self.model)
+        self._onnx_session = onnxruntime.InferenceSession(
+            onnx_model.SerializeToString(),
+            providers=['CUDAExecutionProvider', 'CPUExecutionProvider'])
+        self._onnx_input = self._onnx_session.get_inputs()[0].name
+
+    # 少数サンプルの推論はpredict()のグラフトレースが支配的なので__call__を使う
+    @tf.function(experimental_relax_shapes=True)
+    def _infer(self, x):
+        return self.model(x, training=False)
+
+    # SMILESからDAT/NETの活性確率を予測
+    def predict(self, smiles):
+        descriptors = compute_descriptors(smiles)
+        if descriptors is None:
+            return None
+        scaled = self.scaler.transform(np.array([descriptors])).astype(np.float32)
+        if self._onnx_session is not None:
+            return self._onnx_session.run(None, {self._onnx_input: scaled})[0][0]
+        return self._infer(tf.constant(scaled)).numpy()[0]
+
+    # コカインとアンフェタミンで予測を確認
+    def predict_cocaine_and_amphetamine(self):
+        cocaine = 'CN1C2CCC1C(C(C2)OC(=O)c1ccccc1)C(=O)OC'
+        amphetamine = 'CC(N)Cc1ccccc1'
+        for name, smiles in [('Cocaine', cocaine), ('Amphetamine', amphetamine)]:
+            pred = self.predict(smiles)
+            print(f"{name}: DAT={pred[0]:.3f}, NET={pred[1]:.3f}")
+
+    # 外部データ(CSV)での評価
+    def evaluate_on_external_data(self, csv_path):
+        df = pd.read_csv(csv_path)
+        results = []
+        for smiles in df['smiles'].to_numpy():
+            pred = self.predict(smiles)
+            if pred is not None:
+                results.append(pred)
+        return np.array(results)
+
+    # ランダムフォレストは一度だけ学習して使い回す
+    def _get_rf(self):
+        if self._rf_model is None:
+            self._rf_model = RandomForestClassifier(
+                n_estimators=100, random_state=42, n_jobs=-1).fit(self._X_train, self._y_train)
+        return self._rf_model
+
+    # ニューラルネットとランダムフォレストを比較
+    def compare_models(self, plot=True):
+        rf_model = self._get_rf()
+
+        # 推論はDAT/NETをまとめて1回だけ行い、以降の指標は結果を使い回す
+        nn_prob = self.model.predict(
+            np.concatenate((self.test_data_scaled_dat, self.test_data_scaled_net)), batch_size=512)
+        nn_prob_dat, nn_prob_net = np.split(nn_prob, [len(self.test_data_scaled_dat)])
+        nn_prob_dat = nn_prob_dat[:, 0]
+        nn_prob_net = nn_prob_net[:, 1]
+        nn_pred_dat = _cls(nn_prob_dat)
+        nn_pred_net = _cls(nn_prob_net)
+
+        # ニューラルネットの評価
+        print(f"NN DAT precision: {precision_score(self.test_labels_dat, nn_pred_dat)}")
+        print(f"NN DAT recall: {recall_score(self.test_labels_dat, nn_pred_dat)}")
+        print(f"NN DAT F1: {f1_score(self.test_labels_dat, nn_pred_dat)}")
+        print(f"NN NET precision: {precision_score(self.test_labels_net, nn_pred_net)}")
+        print(f"NN NET recall: {recall_score(self.test_labels_net, nn_pred_net)}")
+        print(f"NN NET F1: {f1_score(self.test_labels_net, nn_pred_net)}")
+
+        # ランダムフォレストの評価
+        rf_pred_dat = rf_model.predict(self.test_data_scaled_dat)[:, 0]
+        rf_pred_net = rf_model.predict(self.test_data_scaled_net)[:, 1]
+        print(f"RF DAT precision: {precision_score(self.test_labels_dat, rf_pred_dat)}")
+        print(f"RF NET precision: {precision_score(self.test_labels_net, rf_pred_net)}")
+
+        # ROC曲線（キャッシュ済みの確率をそのまま使う）
+        fpr_nn, tpr_nn, _ = roc_curve(self.test_labels_dat, nn_prob_dat)
+        fpr_rf, tpr_rf, _ = roc_curve(self.test_labels_dat, rf_model.predict_proba(self.test_data_scaled_dat)[0][:, 1])
+        fig, ax = plt.subplots(figsize=(8, 6))
+        ax.plot(fpr_nn, tpr_nn, label=f'NN (AUC = {auc(fpr_nn, tpr_nn):.3f})')
+        ax.plot(fpr_rf, tpr_rf, label=f'RF (AUC = {auc(fpr_rf, tpr_rf):.3f})')
+        ax.plot([0, 1], [0, 1], 'k--')
+        ax.set_xlabel('False Positive Rate')
+        ax.set_ylabel('True Positive Rate')
+        ax.set_title('ROC curve (DAT)')
+        ax.legend()
+        if plot:
+            plt.show()
+        plt.close(fig)
+
+    # ランダムフォレストの特徴量重要度を可視化
+    def visualize_feature_importance(self, plot=True):
+        rf_model = self._get_rf()
+
+        fig, ax = plt.subplots(figsize=(10, 6))
+        ax.bar(DESCRIPTOR_NAMES, rf_model.feature_importances_)
+        ax.tick_params(axis='x', rotation=45)
+        ax.set_ylabel('Feature importance')
+        fig.tight_layout()
+        if plot:
+            plt.show()
+        plt.close(fig)
+
+        # Permutation importance
+        # RFは(DAT, NET)の2列ラベルで学習しているので、スコアリングにも同じ形のラベルを渡す
+        y_test = np.column_stack((self.test_labels_dat, self.test_labels_net))
+        result = permutation_importance(rf_model, self.test_data_scaled_dat, y_test,
+                                        n_repeats=10, random_state=42, n_jobs=-1)
+        fig, ax = plt.subplots(figsize=(10, 6))
+        ax.bar(DESCRIPTOR_NAMES, result.importances_mean)
+        ax.tick_params(axis='x', rotation=45)
+        ax.set_ylabel('Permutation importance')
+        fig.tight_layout()
+        if plot:
+            plt.show()
+        plt.close(fig)
+
+    # 学習曲線をプロット
+    def plot_learning_curve(self, plot=True):
+        params = self.best_params or {}
+        x = self._X_train
+        y = self._y_train
+        # learning_curveはscikit-learn推定器を要求するのでKerasClassifierでラップする
+        # （selfを閉じ込めたlambdaはtf.dataパイプラインごとpickleしようとして
+        # loky並列で落ちるので、モジュールレベルのbuild_modelをpartialで束ねる）
+        estimator = KerasClassifier(build_fn=partial(build_model, **params),
+                                    epochs=50, batch_size=256, verbose=0)
+        # CV分割は先にリストとして具体化し、全train_sizeで同じ分割を使い回す
+        # （pre_dispatch='n_jobs'でjoblibの先行ディスパッチによる過剰な複製も抑える）
+        splits = list(StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+                      .split(x, y[:, 0]))
+        train_sizes, train_scores, test_scores = learning_curve(
+            estimator, x, y, cv=splits, n_jobs=-1, pre_dispatch='n_jobs',
+            train_sizes=np.linspace(0.2, 1.0, 5))
+
+        # np.mean/np.stdを別々に呼ぶと各配列を2回走査するので、
+        # 平均を使い回して偏差の2乗平均から1パスでstdを得る
+        def _mean_std(scores):
+            mean = scores.mean(axis=1)
+            std = np.sqrt(np.square(scores - mean[:, None]).mean(axis=1))
+            return mean, std
+
+        train_mean, train_std = _mean_std(train_scores)
+        test_mean, test_std = _mean_std(test_scores)
+
+        fig, ax = plt.subplots(figsize=(8, 6))
+        ax.plot(train_sizes, train_mean, 'o-', label='Training score')
+        ax.fill_between(train_sizes, train_mean - train_std, train_mean + train_std, alpha=0.1)
+        ax.plot(train_sizes, test_mean, 'o-', label='Cross-validation score')
+        ax.fill_between(train_sizes, test_mean - test_std, test_mean + test_std, alpha=0.1)
+        ax.set_xlabel('Training examples')
+        ax.set_ylabel('Score')
+        ax.legend()
+        if plot:
+            plt.show()
+        plt.close(fig)
+
+    # Optunaのハイパーパラメータ重要度を可視化
+    def visualize_hyperparameter_importance(self, study, plot=True):
+        ax = optuna.visualization.matplotlib.plot_param_importances(study)
+        if plot:
+            plt.show()
+        plt.close(ax.figure)
+
+    # SHAPでモデルを解釈
+    def interpret_model(self, plot=True):
+        # 背景データは全学習データではなく100点に要約する
+        # （SHAPの評価回数は |背景| x |サンプル| に比例する）
+        background = shap.sample(self._X_train, 100)
+        explainer = shap.GradientExplainer(self.model, background)
+        sample_data = self.test_data_scaled_dat[:10]
+        # 勾配ベースの説明はDAT/NET両ヘッド分を1回の呼び出しで得られるので、
+        # ヘッドごとにexplainerを作り直さない
+        shap_values = explainer.shap_values(sample_data)
+        for head, name in enumerate(('DAT', 'NET')):
+            shap.summary_plot(shap_values[head], sample_data,
+                              feature_names=DESCRIPTOR_NAMES, show=False)
+            plt.title(f'SHAP summary ({name})')
+            if plot:
+                plt.show()
+            plt.close(plt.gcf())
+
+
+def main():
+    predictor = IC50Predictor()
+
+    # ハイパーパラメータ最適化
+    study = predictor.optuna_optimize(n_trials=100)
+    predictor.best_params = study.best_params
+
+    # グリッド探索はOptunaの結果を使う既定の実行経路では不要なので、
+    # 明示的に要求されたときだけ走らせる
+    if os.environ.get('RUN_GRID_SEARCH'):
+        best_params_grid = predictor.grid_search_optimize()
+        print(f"Grid search best params: {best_params_grid}")
+
+    # 学習と評価
+    predictor.train_and_evaluate()
+    predictor.compare_models()
+    predictor.visualize_feature_importance()
+    predictor.plot_learning_curve()
+    predictor.visualize_hyperparameter_importance(study)
+    predictor.interpret_model()
+    predictor.predict_cocaine_and_amphetamine()
+
+
+if __name__ == '__main__':
+    main()
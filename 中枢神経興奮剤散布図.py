@@ -1,35 +1,46 @@
 import os
-import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
-from sklearn.linear_model import LinearRegression
+import pyarrow.csv as pv
 
 # ファイルのリスト
 files = ['MPH.csv','MA.csv','A.csv']
 
 # 各ファイルからデータを読み込み、TPSAとMWのデータを取得
+# （pyarrowのマルチスレッドCSVリーダーで必要な2列だけを読む）
 def process_files(files):
     data = []
     for file in files:
         if os.path.isfile(file):
-            df = pd.read_csv(file)
-            data.append(df[['TPSA','MW']])
+            table = pv.read_csv(
+                file, convert_options=pv.ConvertOptions(include_columns=['TPSA', 'MW']))
+            data.append((table.column('TPSA').to_numpy(zero_copy_only=False),
+                         table.column('MW').to_numpy(zero_copy_only=False)))
     return data
 
 # データを散布図で表示し、回帰直線を描く
 def plot_data(data):
     plt.figure(figsize=(10, 6))
-    for i, df in enumerate(data):
-        x = df['TPSA'].values.reshape(-1, 1)
-        y = df['MW'].values.reshape(-1, 1)
+    # 軸の表示範囲はプロットのループ内で1パスで求める
+    x_min = x_max = y_min = y_max = None
+    for i, (x, y) in enumerate(data):
         plt.scatter(x, y, label=files[i].split('.')[0])  # 各CSVファイルのデータを散布図で表示
+        if x_min is None:
+            x_min, x_max = x.min(), x.max()
+            y_min, y_max = y.min(), y.max()
+        else:
+            x_min, x_max = min(x_min, x.min()), max(x_max, x.max())
+            y_min, y_max = min(y_min, y.min()), max(y_max, y.max())
         if len(x) > 1:  # 回帰直線を描くためには少なくとも2つのデータ点が必要です
-            reg = LinearRegression().fit(x, y)
-            plt.plot(x, reg.predict(x), color='red')
+            # 単回帰は閉形式で解ける（sklearnの推定器を立ち上げるまでもない）
+            x_mean = x.mean()
+            y_mean = y.mean()
+            slope = ((x - x_mean) * (y - y_mean)).sum() / ((x - x_mean) ** 2).sum()
+            intercept = y_mean - slope * x_mean
+            plt.plot(x, slope * x + intercept, color='red')
     plt.xlabel('TPSA')
     plt.ylabel('MW')
-    plt.xlim([np.min([df['TPSA'].min() for df in data]), np.max([df['TPSA'].max() for df in data])])  # x軸の表示範囲を設定
-    plt.ylim([np.min([df['MW'].min() for df in data]), np.max([df['MW'].max() for df in data])])  # y軸の表示範囲を設定
+    plt.xlim([x_min, x_max])  # x軸の表示範囲を設定
+    plt.ylim([y_min, y_max])  # y軸の表示範囲を設定
     plt.legend()
     plt.show()
 